@@ -1,7 +1,21 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+# Plotly serializes figures with orjson automatically when it is installed.
+
+# PyArrow's multi-threaded CSV reader parses much faster than the C engine.
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
 # -------------------------------
 # PAGE CONFIG
 # -------------------------------
@@ -15,110 +29,319 @@ st.markdown(
     """
 )
 
+# -------------------------------
+# CACHED LOADERS
+# -------------------------------
+# Streamlit reruns the whole script on every widget change, so each loader is
+# keyed on the raw upload bytes and only reparses when the file itself changes.
+@st.cache_data(show_spinner=False)
+def load_time_df(data):
+    df = pd.read_csv(io.BytesIO(data), engine=CSV_ENGINE, parse_dates=['date']).set_index('date')
+    # Drop 'isPartial' column if present
+    df = df.drop(columns=['isPartial'], errors='ignore')
+    # Exports mark tiny values as "<1"; treat them as 0 and never fail on stray text
+    df = df.replace("<1", 0).apply(pd.to_numeric, errors='coerce')
+    # Interest values are 0-100, so store them in the smallest integer type
+    return df.apply(pd.to_numeric, downcast='integer')
+
+
+@st.cache_data(show_spinner=False)
+def load_region_df(data):
+    return pd.read_csv(io.BytesIO(data), engine=CSV_ENGINE, index_col=0)
+
+
+@st.cache_data(show_spinner=False)
+def load_related_df(data):
+    return pd.read_csv(io.BytesIO(data), engine=CSV_ENGINE, index_col=0)
+
+
+# -------------------------------
+# CACHED AGGREGATIONS
+# -------------------------------
+# Derived frames only depend on the data and their own parameters, so they are
+# cached too; yearly_mean and corr_matrix run on worker threads and are memoized
+# by their futures below instead. Aggregations run in float32 to halve the
+# memory they stream through.
+def yearly_mean(df):
+    # A plain groupby on year periods avoids resample's bin construction;
+    # to_timestamp keeps a DatetimeIndex so the x-axis still renders as dates
+    df = df.astype("float32")
+    return df.groupby(df.index.to_period("Y")).mean().to_timestamp()
+
+
+def corr_matrix(df):
+    a = df.to_numpy(dtype=np.float32, copy=True)
+    if np.isnan(a).any():
+        # pandas handles missing values pairwise
+        return df.astype("float32").corr()
+    # Standardize the columns once, then a single matmul gives every pair
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a -= a.mean(axis=0)
+        a /= a.std(axis=0)
+    c = (a.T @ a) / a.shape[0]
+    return pd.DataFrame(c, index=df.columns, columns=df.columns)
+
+
+@st.cache_data(show_spinner=False)
+def rolling_means(df, window):
+    # All keywords in one pass, so switching keyword is just a column lookup
+    return df.astype("float32").rolling(window=window).mean()
+
+
+def top_n_order(values, n):
+    # Partial selection is O(N); only the n winners get sorted
+    values = np.asarray(values, dtype=np.float64)
+    n = min(n, len(values))
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(-values, n - 1)[:n]
+    return idx[np.argsort(-values[idx], kind="stable")]
+
+
+@st.cache_data(show_spinner=False)
+def top_n(series, n=5):
+    return series.iloc[top_n_order(series.to_numpy(), n)]
+
+
+# -------------------------------
+# BACKGROUND AGGREGATION
+# -------------------------------
+# The aggregations are started in worker threads as soon as data is loaded so
+# the preview paints first; pandas/NumPy release the GIL for the heavy parts.
+@st.cache_resource(show_spinner=False)
+def aggregate_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8, ttl="1h")
+def precompute_aggregates(_df, df_hash):
+    executor = aggregate_executor()
+    return {
+        "yearly": executor.submit(yearly_mean, _df),
+        "corr": executor.submit(corr_matrix, _df),
+    }
+
+
+def await_aggregate(future):
+    if not future.done():
+        with st.status("Computing aggregates…") as status:
+            future.result()
+            status.update(label="Aggregates ready", state="complete")
+    return future.result()
+
+
+# -------------------------------
+# PLOT DOWNSAMPLING
+# -------------------------------
+# A chart can't show more points than it has pixels, so long series are
+# stride-sampled before plotting to keep serialization and rendering bounded.
+MAX_PLOT_POINTS = 2000
+
+
+def thin(obj, max_points=MAX_PLOT_POINTS):
+    if len(obj) <= max_points:
+        return obj
+    step = -(-len(obj) // max_points)
+    positions = np.arange(0, len(obj), step)
+    # Always keep the latest row so the chart ends where the data does
+    if positions[-1] != len(obj) - 1:
+        positions = np.append(positions, len(obj) - 1)
+    return obj.iloc[positions]
+
+
+# -------------------------------
+# CACHED FIGURES
+# -------------------------------
+# Figures are cached as objects keyed by the upload's hash plus their own
+# parameters, so an unchanged chart is reused instead of rebuilt each rerun.
+# Data arguments are passed unhashed (leading underscore). The caches are shared
+# by every session, so they are bounded to keep a long-running server's memory flat.
+FIGURE_CACHE_ENTRIES = 32
+FIGURE_CACHE_TTL = "1h"
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES, ttl=FIGURE_CACHE_TTL)
+def build_timeseries_fig(_df, df_hash, keys):
+    plot_df = thin(_df)
+    fig = px.line(plot_df, x=plot_df.index, y=list(keys), labels={"value": "Search Interest", "date": "Date"}, title="Search Interest Over Time", render_mode="webgl")
+    fig.update_traces(mode="lines+markers")
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES, ttl=FIGURE_CACHE_TTL)
+def build_yearly_fig(_yearly, df_hash):
+    return px.line(_yearly, x=_yearly.index, y=_yearly.columns, markers=True,
+                   labels={"value": "Avg Search Interest", "date": "Year"},
+                   title="Average Yearly Search Interest", render_mode="webgl")
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES, ttl=FIGURE_CACHE_TTL)
+def build_corr_fig(_corr, df_hash):
+    # Per-cell labels dominate render time for large matrices, so only small ones
+    # get them; larger ones rely on hover instead
+    text_auto = ".2f" if _corr.shape[0] <= 12 else False
+    return px.imshow(_corr, text_auto=text_auto, aspect="auto", color_continuous_scale="Blues", title="Correlation Heatmap")
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES, ttl=FIGURE_CACHE_TTL)
+def build_peaks_fig(_df, df_hash, keyword):
+    peaks = top_n(_df[keyword], 5)
+    # Stride sampling can skip the extremes, so keep the peak rows on the trace
+    plot_df = _df.loc[thin(_df).index.union(peaks.index)]
+    fig = px.line(plot_df, x=plot_df.index, y=keyword, title=f"Peaks in {keyword} Search Trend",
+                  render_mode="webgl")
+    fig.add_scattergl(x=peaks.index, y=peaks.values, mode="markers+text",
+                      marker=dict(size=12, color="red"),
+                      text=np.char.add("Peak: ", peaks.values.astype("U")),
+                      textposition="top center", name="Peaks")
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES, ttl=FIGURE_CACHE_TTL)
+def build_moving_average_fig(_df, df_hash, keyword, window):
+    series, df_ma = _df[keyword], rolling_means(_df, window)[keyword]
+    series_plot, ma_plot = thin(series), thin(df_ma)
+    fig = px.line(x=series_plot.index, y=[series_plot, ma_plot],
+                  labels={"x": "Date", "y": "Search Interest"},
+                  title=f"{keyword} Trend with {window}-Month Moving Average",
+                  render_mode="webgl")
+    fig.update_traces(mode="lines")
+    return fig
+
+
 # -------------------------------
 # FILE UPLOAD
 # -------------------------------
 st.sidebar.header("⚙️ Controls")
 uploaded_file = st.sidebar.file_uploader("Upload Google Trends CSV (interest_over_time)", type="csv")
+# Kept in the sidebar so uploads survive switching between sections
+region_file = st.sidebar.file_uploader("Upload Regional CSV (interest_by_region)", type="csv")
+related_file = st.sidebar.file_uploader("Upload Related Queries CSV", type="csv")
+
+SECTIONS = ["Overview", "Yearly", "Correlation", "Peaks", "Smoothing", "Regional", "Related"]
+KEYWORD_SECTIONS = {"Peaks", "Smoothing", "Regional", "Related"}
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file, parse_dates=['date'], index_col='date')
+    data = uploaded_file.getvalue()
+    df = load_time_df(data)
+    df_hash = hashlib.md5(data).hexdigest()
+    aggregates = precompute_aggregates(df, df_hash)
+    cols = df.columns.tolist()
+    idx = df.index
 
-    # Drop 'isPartial' column if present
-    if 'isPartial' in df.columns:
-        df = df.drop(columns=['isPartial'])
+    # Streamlit drops the state of widgets that aren't rendered, which happens to
+    # every section but the selected one; seeding the keys and re-assigning them
+    # each run keeps those choices while the section is hidden
+    keywords_key = f"plot_keywords_{df_hash}"
+    keyword_key = f"selected_keyword_{df_hash}"
+    st.session_state.setdefault(keywords_key, cols)
+    st.session_state.setdefault(keyword_key, cols[0] if cols else None)
+    st.session_state.setdefault("ma_window", 12)
+    for key in (keywords_key, keyword_key, "ma_window"):
+        st.session_state[key] = st.session_state[key]
 
-    st.subheader("📄 Dataset Preview")
-    st.dataframe(df.head())
+    # Only the chosen section runs, so hidden charts are never built
+    section = st.sidebar.radio("Section", SECTIONS)
+    # The keyword picker only shows where a chart depends on it
+    if section in KEYWORD_SECTIONS:
+        selected_keyword = st.sidebar.selectbox("Choose a Keyword", cols, key=keyword_key)
 
-    # -------------------------------
-    # TIME SERIES PLOT
-    # -------------------------------
-    st.subheader("📈 Search Trends Over Time")
-    keywords = st.multiselect("Select Keywords to Plot", df.columns.tolist(), default=df.columns.tolist())
-    
-    if keywords:
-        fig = px.line(df, x=df.index, y=keywords, labels={"value": "Search Interest", "date": "Date"}, title="Search Interest Over Time")
-        fig.update_traces(mode="lines+markers")
-        st.plotly_chart(fig, use_container_width=True)
-        st.markdown(
-            f"✅ The chart shows how selected keywords evolved between **{df.index.min().date()}** and **{df.index.max().date()}**. "
-            "Notice the **spikes** and **growth trends** that often correspond to global events or announcements."
-        )
+    if section == "Overview":
+        st.subheader("📄 Dataset Preview")
+        st.dataframe(df.head())
+
+        # -------------------------------
+        # TIME SERIES PLOT
+        # -------------------------------
+        st.subheader("📈 Search Trends Over Time")
+        keywords = st.multiselect("Select Keywords to Plot", cols, key=keywords_key)
+
+        if keywords:
+            fig = build_timeseries_fig(df, df_hash, tuple(keywords))
+            st.plotly_chart(fig, use_container_width=True)
+            st.markdown(
+                f"✅ The chart shows how selected keywords evolved between **{idx.min().date()}** and **{idx.max().date()}**. "
+                "Notice the **spikes** and **growth trends** that often correspond to global events or announcements."
+            )
 
     # -------------------------------
     # YEARLY AVERAGE
     # -------------------------------
-    st.subheader("📊 Average Yearly Interest")
-    yearly = df.resample("Y").mean()
-    fig2 = px.line(yearly, x=yearly.index, y=yearly.columns, markers=True,
-                   labels={"value": "Avg Search Interest", "date": "Year"},
-                   title="Average Yearly Search Interest")
-    st.plotly_chart(fig2, use_container_width=True)
-    st.markdown("✅ This chart shows the **long-term growth trend** of each topic, smoothed by yearly averages.")
+    elif section == "Yearly":
+        st.subheader("📊 Average Yearly Interest")
+        fig2 = build_yearly_fig(await_aggregate(aggregates["yearly"]), df_hash)
+        st.plotly_chart(fig2, use_container_width=True)
+        st.markdown("✅ This chart shows the **long-term growth trend** of each topic, smoothed by yearly averages.")
 
     # -------------------------------
     # CORRELATION HEATMAP
     # -------------------------------
-    st.subheader("🔗 Correlation Between Keywords")
-    corr = df.corr()
-    fig3 = px.imshow(corr, text_auto=True, color_continuous_scale="Blues", title="Correlation Heatmap")
-    st.plotly_chart(fig3, use_container_width=True)
-    st.markdown("✅ High correlation (close to 1) means that topics trend together (e.g., *AI* and *Data Analytics*).")
+    elif section == "Correlation":
+        st.subheader("🔗 Correlation Between Keywords")
+        fig3 = build_corr_fig(await_aggregate(aggregates["corr"]), df_hash)
+        st.plotly_chart(fig3, use_container_width=True)
+        st.markdown("✅ High correlation (close to 1) means that topics trend together (e.g., *AI* and *Data Analytics*).")
 
     # -------------------------------
     # PEAK ANALYSIS
     # -------------------------------
-    st.subheader("📌 Top 5 Peaks in Interest")
-    selected_keyword = st.selectbox("Choose a Keyword", df.columns.tolist())
-    peaks = df[selected_keyword].sort_values(ascending=False).head(5)
-    fig4 = px.line(df, x=df.index, y=selected_keyword, title=f"Peaks in {selected_keyword} Search Trend")
-    fig4.add_scatter(x=peaks.index, y=peaks.values, mode="markers+text",
-                     marker=dict(size=12, color="red"),
-                     text=[f"Peak: {v}" for v in peaks.values],
-                     textposition="top center", name="Peaks")
-    st.plotly_chart(fig4, use_container_width=True)
-    st.markdown(f"✅ The red points highlight the **highest interest periods** for *{selected_keyword}*.")
+    elif section == "Peaks":
+        st.subheader("📌 Top 5 Peaks in Interest")
+        fig4 = build_peaks_fig(df, df_hash, selected_keyword)
+        st.plotly_chart(fig4, use_container_width=True)
+        st.markdown(f"✅ The red points highlight the **highest interest periods** for *{selected_keyword}*.")
 
     # -------------------------------
     # MOVING AVERAGE
     # -------------------------------
-    st.subheader("📉 Trend Smoothing (Moving Average)")
-    window = st.slider("Select Rolling Window (Months)", min_value=3, max_value=24, value=12)
-    df_ma = df[selected_keyword].rolling(window=window).mean()
-    fig5 = px.line(x=df.index, y=[df[selected_keyword], df_ma],
-                   labels={"x": "Date", "y": "Search Interest"},
-                   title=f"{selected_keyword} Trend with {window}-Month Moving Average")
-    fig5.update_traces(mode="lines")
-    st.plotly_chart(fig5, use_container_width=True)
-    st.markdown("✅ The moving average helps **smooth short-term fluctuations** to reveal long-term patterns.")
+    elif section == "Smoothing":
+        st.subheader("📉 Trend Smoothing (Moving Average)")
+
+        # Runs as a fragment so moving the slider only reruns this chart
+        @st.fragment
+        def moving_average_section(df, df_hash, keyword):
+            window = st.slider("Select Rolling Window (Months)", min_value=3, max_value=24, key="ma_window")
+            fig5 = build_moving_average_fig(df, df_hash, keyword, window)
+            st.plotly_chart(fig5, use_container_width=True)
+            st.markdown("✅ The moving average helps **smooth short-term fluctuations** to reveal long-term patterns.")
+
+        moving_average_section(df, df_hash, selected_keyword)
 
     # -------------------------------
     # REGIONAL INTEREST
     # -------------------------------
-    st.subheader("🌍 Regional Interest (Upload Region CSV)")
-    region_file = st.file_uploader("Upload Regional CSV (interest_by_region)", type="csv")
-    if region_file:
-        region_df = pd.read_csv(region_file, index_col=0)
-        top_regions = region_df[selected_keyword].sort_values(ascending=False).head(10)
-        fig6 = px.bar(top_regions, x=top_regions.values, y=top_regions.index, orientation="h",
-                      labels={"x": "Search Interest", "index": "Region"},
-                      title=f"Top 10 Regions Interested in {selected_keyword}")
-        st.plotly_chart(fig6, use_container_width=True)
-        st.markdown("✅ This chart highlights **where the interest is strongest geographically**.")
+    elif section == "Regional":
+        st.subheader("🌍 Regional Interest")
+        if region_file:
+            region_df = load_region_df(region_file.getvalue())
+            top_regions = top_n(region_df[selected_keyword], 10)
+            fig6 = px.bar(top_regions, x=top_regions.values, y=top_regions.index, orientation="h",
+                          labels={"x": "Search Interest", "index": "Region"},
+                          title=f"Top 10 Regions Interested in {selected_keyword}")
+            st.plotly_chart(fig6, use_container_width=True)
+            st.markdown("✅ This chart highlights **where the interest is strongest geographically**.")
+        else:
+            st.info("👈 Upload a regional CSV (interest_by_region) to see this chart.")
 
     # -------------------------------
     # RELATED QUERIES
     # -------------------------------
-    st.subheader("🔍 Related Queries (Upload Related CSV)")
-    related_file = st.file_uploader("Upload Related Queries CSV", type="csv")
-    if related_file:
-        related_df = pd.read_csv(related_file, index_col=0)
-        fig7 = px.bar(related_df.head(10), x="value", y="query", orientation="h",
-                      labels={"value": "Popularity", "query": "Related Query"},
-                      title=f"Top Related Queries for {selected_keyword}")
-        st.plotly_chart(fig7, use_container_width=True)
-        st.markdown("✅ These queries provide context on **what people search alongside the main keyword**.")
+    elif section == "Related":
+        st.subheader("🔍 Related Queries")
+        if related_file:
+            related_df = load_related_df(related_file.getvalue())
+            # Rising-query exports hold text like "Breakout"; keep the file's order for those
+            if pd.api.types.is_numeric_dtype(related_df["value"]):
+                top_related = related_df.iloc[top_n_order(related_df["value"].to_numpy(), 10)]
+            else:
+                top_related = related_df.head(10)
+            fig7 = px.bar(top_related, x="value", y="query", orientation="h",
+                          labels={"value": "Popularity", "query": "Related Query"},
+                          title=f"Top Related Queries for {selected_keyword}")
+            st.plotly_chart(fig7, use_container_width=True)
+            st.markdown("✅ These queries provide context on **what people search alongside the main keyword**.")
+        else:
+            st.info("👈 Upload a related queries CSV to see this chart.")
 
 else:
     st.info("👈 Upload your Google Trends CSV to get started.")